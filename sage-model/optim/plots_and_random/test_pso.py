@@ -1,6 +1,7 @@
 import numpy as np
 from pso import pso
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 def test_pso_reproducibility(n_runs=3):
     """
@@ -22,6 +23,7 @@ def test_pso_reproducibility(n_runs=3):
     swarmsize = 10
     maxiter = 50
     processes = 1  # Use single process for deterministic results
+    seed = 42
     
     # Store results
     results = []
@@ -37,7 +39,7 @@ def test_pso_reproducibility(n_runs=3):
     for i in range(n_runs):
         start_time = time.time()
         xopt, fopt = pso(obj_function, lb, ub, swarmsize=swarmsize, 
-                        maxiter=maxiter, processes=processes)
+                        maxiter=maxiter, processes=processes, seed=seed)
         end_time = time.time()
         
         results.append((xopt, fopt))
@@ -72,9 +74,112 @@ def test_pso_reproducibility(n_runs=3):
     
     return all_identical, results
 
+def test_pso_vectorized_matches_per_particle():
+    """
+    Test that the vectorized (whole swarm) mode gives the same results as
+    evaluating the particles one at a time, for the same seed
+    """
+    
+    # Same sphere function, per particle and for the whole swarm
+    def obj_function(x):
+        return np.sum(x**2)
+    
+    def obj_function_vec(x):
+        return np.sum(x**2, axis=1)
+    
+    # Constraint x[0] >= -4, valid for a single particle or the whole swarm
+    def constraint(x):
+        return x[..., 0] + 4.0
+    
+    lb = [-5.0] * 4
+    ub = [5.0] * 4
+    
+    xopt, fopt = pso(obj_function, lb, ub, ieqcons=[constraint], swarmsize=10,
+                     maxiter=50, processes=1, seed=42, debug=False)
+    xopt_vec, fopt_vec = pso(obj_function_vec, lb, ub, ieqcons=[constraint],
+                             swarmsize=10, maxiter=50, vectorized=True,
+                             seed=42, debug=False)
+    
+    identical = np.array_equal(xopt, xopt_vec) and fopt == fopt_vec
+    print("\nVectorized and per-particle modes identical?", identical)
+    assert identical
+    
+    return identical
+
+def test_pso_jit_matches_numpy():
+    """
+    Test that the numba compiled update (jit=True) gives the same results as
+    the NumPy update for the same seed. Skipped when numba isn't installed
+    """
+    
+    try:
+        import numba # noqa: F401
+    except ImportError:
+        print("\nnumba not installed, skipping jit test")
+        return None
+    
+    def obj_function(x):
+        return np.sum(x**2)
+    
+    lb = [-5.0] * 4
+    ub = [5.0] * 4
+    
+    xopt, fopt = pso(obj_function, lb, ub, swarmsize=10, maxiter=50,
+                     processes=1, seed=42, debug=False)
+    xopt_jit, fopt_jit = pso(obj_function, lb, ub, swarmsize=10, maxiter=50,
+                             processes=1, seed=42, debug=False, jit=True)
+    
+    identical = np.array_equal(xopt, xopt_jit) and fopt == fopt_jit
+    print("\njit and NumPy updates identical?", identical)
+    assert identical
+    
+    return identical
+
+def test_pso_executor_matches_serial():
+    """
+    Test that evaluating the particles through an executor gives the same
+    results as evaluating them serially, for the same seed and with several
+    inequality constraints
+    """
+    
+    def obj_function(x):
+        return np.sum((x - 3.0)**2)
+    
+    # Constraints x[0] <= 1 and x[1] >= -4. The sleep lets the executor
+    # threads interleave between constraint evaluations, as slow constraints
+    # would, so that any state shared between calls shows up
+    def constraint1(x):
+        return 1.0 - x[0]
+    
+    def constraint2(x):
+        time.sleep(1e-4)
+        return x[1] + 4.0
+    
+    lb = [-5.0] * 2
+    ub = [5.0] * 2
+    ieqcons = [constraint1, constraint2]
+    
+    xopt, fopt = pso(obj_function, lb, ub, ieqcons=ieqcons, swarmsize=20,
+                     maxiter=50, processes=1, seed=5, debug=False)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        xopt_ex, fopt_ex = pso(obj_function, lb, ub, ieqcons=ieqcons,
+                               swarmsize=20, maxiter=50, seed=5, debug=False,
+                               executor=executor)
+    
+    identical = np.array_equal(xopt, xopt_ex) and fopt == fopt_ex
+    print("\nExecutor and serial evaluation identical?", identical)
+    assert identical
+    assert constraint1(xopt_ex) >= 0 and constraint2(xopt_ex) >= 0
+    
+    return identical
+
 if __name__ == "__main__":
     success, results = test_pso_reproducibility(n_runs=3)
     
     if not success:
         print("\nWARNING: PSO runs produced different results!")
-        print("Check the random seed implementation.")
\ No newline at end of file
+        print("Check the random seed implementation.")
+    
+    test_pso_vectorized_matches_per_particle()
+    test_pso_jit_matches_numpy()
+    test_pso_executor_matches_serial()
\ No newline at end of file
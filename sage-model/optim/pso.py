@@ -9,94 +9,172 @@ import os
 import logging
 import time
 import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
 
-def _write_results_to_csv(csv_path, iteration_history, final_positions, particle_fitness, best_position, best_fitness, max_retries=3):
+logger = logging.getLogger(__name__)
+
+def _open_results_csv(csv_path, max_retries=3):
     """
-    Write PSO results to CSV, including full iteration history.
+    Open the PSO results CSV so that each iteration can be written as it
+    finishes.
     
     Parameters:
     -----------
     csv_path : str
         Path to save the CSV file
-    iteration_history : list of tuples
-        List containing (iteration, positions, fitness) for each iteration
-    final_positions : array
-        Final positions of all particles
-    particle_fitness : array
-        Final fitness values of all particles
-    best_position : array
-        Best position found
-    best_fitness : float
-        Best fitness value found
     max_retries : int
-        Maximum number of retry attempts for writing CSV
+        Maximum number of retry attempts for opening the CSV
+    
+    Returns:
+    --------
+    csvfile : file object or None
+        The open CSV file, or None if it could not be opened
     """
     
-    # Logging setup
-    logging.basicConfig(level=logging.INFO,
-                       format='%(asctime)s - %(levelname)s - %(message)s',
-                       filename='pso_csv_log.txt')
+    # Ensure the directory exists and is writable before trying to open
+    directory = os.path.dirname(csv_path) or '.'
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError as e:
+        logger.error(f"Could not create directory {directory}: {e}")
+        return None
+    if not os.access(directory, os.W_OK):
+        logger.error(f"No write permissions for directory: {directory}")
+        return None
     
-    # Thread-safe lock
-    csv_write_lock = threading.Lock()
+    for attempt in range(max_retries):
+        try:
+            # Open file in write mode
+            csvfile = open(csv_path, 'w', newline='')
+            logger.info(f"CSV opened for writing at {csv_path}")
+            return csvfile
+            
+        except Exception as e:
+            logger.error(f"Attempt {attempt + 1} failed: {e}", exc_info=True)
+            time.sleep(0.1)  # Small delay between attempts
     
-    with csv_write_lock:
-        for attempt in range(max_retries):
-            try:
-                # Check directory permissions
-                directory = os.path.dirname(csv_path)
-                if not os.access(directory, os.W_OK):
-                    logging.error(f"No write permissions for directory: {directory}")
-                    return
-                
-                # Ensure directory exists
-                os.makedirs(directory, exist_ok=True)
-                
-                # Open file in write mode
-                with open(csv_path, 'w', newline='') as csvfile:
-                    csvwriter = csv.writer(csvfile, delimiter='\t')
-                    
-                    # Write iteration history
-                    for it, positions, fitness in iteration_history:
-                        for particle_idx in range(len(positions)):
-                            row = list(positions[particle_idx])
-                            row.append(fitness[particle_idx])
-                            csvwriter.writerow(row)
-                    
-                    # Add blank line before best position
-                    csvwriter.writerow([])
-                    # Write final best position and score format at the end (last 2 rows)
-                    csvwriter.writerow(list(best_position))  # Second to last row: best position
-                    csvwriter.writerow([best_fitness])       # Last row: best fitness score
-                
-                logging.info(f"CSV successfully written to {csv_path}")
-                return
-                
-            except Exception as e:
-                logging.error(f"Attempt {attempt + 1} failed: {e}", exc_info=True)
-                time.sleep(0.1)  # Small delay between attempts
-        
-        logging.error(f"Failed to write CSV after {max_retries} attempts")
+    logger.error(f"Failed to open CSV after {max_retries} attempts")
+    return None
+
+def _write_iteration_to_csv(csvfile, positions, fitness):
+    """
+    Append one row per particle, with its position followed by its fitness.
+    The rows are purely numeric, so they are formatted directly and written
+    in a single call rather than going through the csv module row by row,
+    using the same tab delimiter and line terminator as csv.writer.
+    """
+    rows = np.column_stack([positions, fitness]).tolist()
+    csvfile.write(''.join('\t'.join(map(str, row)) + '\r\n' for row in rows))
+
+def _csv_writer_loop(csv_queue, csvfile):
+    """
+    Write the (positions, fitness) iterations put on csv_queue to csvfile,
+    until None is received. Runs in a background thread so that the file
+    I/O stays off the optimizer's critical path.
+    """
+    while True:
+        item = csv_queue.get()
+        if item is None:
+            return
+        try:
+            _write_iteration_to_csv(csvfile, *item)
+        except Exception as e:
+            logger.error(f"Failed to write iteration to CSV: {e}", exc_info=True)
+
+def _write_best_to_csv(csvwriter, best_position, best_fitness):
+    """
+    Write the final best position and score at the end of the CSV (last 2
+    rows), separated from the iteration history by a blank line.
+    """
+    csvwriter.writerow([])
+    csvwriter.writerow(list(best_position))  # Second to last row: best position
+    csvwriter.writerow([best_fitness])       # Last row: best fitness score
 
 def _obj_wrapper(func, args, kwargs, x):
     return func(x, *args, **kwargs)
 
+def _indexed_eval_wrapper(obj, is_feasible, item):
+    i, x = item
+    fs = is_feasible(x)
+    return i, obj(x) if fs else np.inf, fs
+
 def _is_feasible_wrapper(func, x):
-    return np.all(func(x)>=0)
+    return np.all(np.asarray(func(x))>=0)
+
+def _is_feasible_wrapper_vec(func, x):
+    return np.all(func(x)>=0, axis=0)
 
 def _cons_none_wrapper(x):
     return np.array([0])
 
+def _cons_none_wrapper_vec(x):
+    return np.zeros((1, len(x)))
+
 def _cons_ieqcons_wrapper(ieqcons, args, kwargs, x):
-    return np.array([y(x, *args, **kwargs) for y in ieqcons])
+    # A fresh array per call: this can run concurrently in executor threads
+    return np.fromiter((y(x, *args, **kwargs) for y in ieqcons), dtype=float, count=len(ieqcons))
+
+def _cons_ieqcons_wrapper_vec(ieqcons, args, kwargs, out, x):
+    # out is preallocated for the whole swarm, with one row per constraint.
+    # This is only used in vectorized mode, which evaluates in this thread
+    if out.shape[1] != len(x):
+        out = np.empty((len(ieqcons), len(x)))
+    for j, y in enumerate(ieqcons):
+        out[j] = y(x, *args, **kwargs)
+    return out
 
 def _cons_f_ieqcons_wrapper(f_ieqcons, args, kwargs, x):
     return np.array(f_ieqcons(x, *args, **kwargs))
-    
+
+def _cons_f_ieqcons_wrapper_vec(f_ieqcons, args, kwargs, x):
+    return np.reshape(f_ieqcons(x, *args, **kwargs), (len(x), -1)).T
+
+def _pso_step_kernel(x, v, p, g, lb, ub, rp, rg, omega, phip, phig):
+    """
+    Update the velocities and positions of all particles in place, clipping
+    the positions to the bounds, in a single pass over the swarm.
+    """
+    S, D = x.shape
+    for i in range(S):
+        for d in range(D):
+            vid = omega*v[i, d] + phip*rp[i, d]*(p[i, d] - x[i, d]) + phig*rg[i, d]*(g[d] - x[i, d])
+            xid = x[i, d] + vid
+            if xid < lb[d]:
+                xid = lb[d]
+            elif xid > ub[d]:
+                xid = ub[d]
+            v[i, d] = vid
+            x[i, d] = xid
+
+# Compiled kernel, built on first use by _get_pso_step
+_pso_step = None
+
+def _get_pso_step():
+    """
+    Return _pso_step_kernel compiled by numba. numba is only imported here,
+    so that importing this module (including in pool workers) doesn't pay
+    for it when jit is not used.
+    """
+    global _pso_step
+    if _pso_step is None:
+        try:
+            from numba import njit # type: ignore
+        except ImportError:
+            raise ImportError('numba is required to use jit=True')
+        # Compiled serially and without fastmath, so that results are
+        # bit-identical to the NumPy update for the same seed. A parallel
+        # kernel would start a threading layer that is not safe to fork for
+        # the multiprocessing pool.
+        _pso_step = njit(_pso_step_kernel)
+    return _pso_step
+
 def pso(func, lb, ub, ieqcons=[], f_ieqcons=None, args=(), kwargs={}, 
         swarmsize=100, omega=0.5, phip=0.7, phig=0.3, maxiter=100, 
         minstep=1e-3, minfunc=1e-3, debug=True, processes=1,
-        particle_output=False, dumpfile_prefix=None, csv_output_path=None):
+        particle_output=False, dumpfile_prefix=None, csv_output_path=None,
+        vectorized=False, seed=None, jit=False, variant='standard',
+        alpha=0.2, beta=0.5, executor=None):
     """
     Perform a particle swarm optimization (PSO)
    
@@ -148,13 +226,60 @@ def pso(func, lb, ub, ieqcons=[], f_ieqcons=None, args=(), kwargs={},
     processes : int
         The number of processes to use to evaluate objective function and 
         constraints. If processes = 0 then all particles are given to a single
-        handling function to deal with them all at once (default: 1)
+        handling function to deal with them all at once, which is the same as
+        setting vectorized=True. Ignored when vectorized=True, as the whole
+        swarm is then evaluated in this process (default: 1)
     particle_output : boolean
         Whether to include the best per-particle position and the objective
         values at those.
+    dumpfile_prefix : str, optional
+        If given, the positions and objective values of all particles at
+        iteration i are saved with np.save to ``dumpfile_prefix % i`` +
+        "_pos" and "_fx". Infeasible particles, for which the objective is
+        not evaluated, have NaN objective values (Default: None)
     csv_output_path : str, optional
-        Path to save CSV file with best positions and their objective values
+        Path to save CSV file with the positions and objective values of all
+        particles at every iteration, followed by the best position and its
+        objective value. Infeasible particles have NaN objective values
         (Default: None)
+    vectorized : boolean
+        If True, the constraints are evaluated once per iteration for the whole
+        swarm: each ieqcons[j] is given an (S, D) array and must return an
+        (S,) array, and f_ieqcons must return an (S, n) array. ``func`` is
+        then called once with only the k <= S feasible particles, as a (k, D)
+        array, and must return a (k,) array of objective values; it is not
+        called at all if no particle is feasible, so it must not assume that
+        its rows line up with the swarm. This is the recommended mode for
+        cheap objective functions, as it avoids one Python call per particle
+        per iteration. No multiprocessing pool is used in this mode, whatever
+        the value of processes (Default: False)
+    seed : int, optional
+        Seed for the random number generator, for reproducible runs
+        (Default: None)
+    jit : boolean
+        If True, update the particle velocities and positions with a kernel
+        compiled by numba, which must be installed. Results are identical to
+        the default NumPy update (Default: False)
+    variant : str
+        Either 'standard' for the usual PSO update, or 'apso' for Accelerated
+        PSO, which only tracks the swarm's best position ``g`` and moves each
+        particle as x = (1 - beta)*x + beta*g + alpha*(ub - lb)*(r - 0.5),
+        with r uniform in [0, 1). APSO keeps no per-particle best positions,
+        halving the swarm state; omega, phip, phig and jit are then unused
+        (Default: 'standard')
+    alpha : scalar
+        APSO scaling of the random step, relative to the bounds (Default: 0.2)
+    beta : scalar
+        APSO attraction towards the swarm's best position (Default: 0.5)
+    executor : object, optional
+        An executor whose ``map(func, iterable, chunksize=...)`` is used to
+        evaluate the particles instead of an internal multiprocessing pool,
+        e.g. a concurrent.futures.ProcessPoolExecutor, an
+        mpi4py.futures.MPIPoolExecutor or a pathos pool. It is not shut down
+        by pso. processes is then only used to size the chunks of particles
+        sent to it, and it is ignored when vectorized=True. A
+        ThreadPoolExecutor only gives correct results if func and the
+        constraint functions are themselves thread-safe (Default: None)
    
     Returns
     =======
@@ -163,7 +288,8 @@ def pso(func, lb, ub, ieqcons=[], f_ieqcons=None, args=(), kwargs={},
     f : scalar
         The objective value at ``g``
     p : array
-        The best known position per particle
+        The best known position per particle (the current positions for
+        variant='apso')
     pf: arrray
         The objective values at each position in p
    
@@ -174,18 +300,36 @@ def pso(func, lb, ub, ieqcons=[], f_ieqcons=None, args=(), kwargs={},
     lb = np.array(lb)
     ub = np.array(ub)
     assert np.all(ub>lb), 'All upper-bound values must be greater than lower-bound values'
+    assert variant in ('standard', 'apso'), "variant must be 'standard' or 'apso'"
+    apso = variant == 'apso'
+
+    # The bounds are ordered, so their span needs no abs and is computed once
+    span = ub - lb
+    vhigh = span
+    vlow = -span
+
+    rng = np.random.default_rng(seed)
 
-    vhigh = np.abs(ub - lb)
-    vlow = -vhigh
+    if jit:
+        pso_step = _get_pso_step()
 
-    # Initialize objective function
-    obj = partial(_obj_wrapper, func, args, kwargs)
+    # Initialize objective function, calling func directly when there are no
+    # extra arguments to pass along
+    if not args and not kwargs:
+        obj = func
+    else:
+        obj = partial(_obj_wrapper, func, args, kwargs)
 
-    # Initialize dumping function if required
+    # Initialize dumping function if required. The files are written by a
+    # thread pool so the optimizer doesn't wait on disk I/O; the positions
+    # are copied because they are updated in place by the next iteration
+    io_pool = None
+    dump_futures = []
     if dumpfile_prefix:
+        io_pool = ThreadPoolExecutor(max_workers=2)
         def dump(i, x, fx):
-            np.save(dumpfile_prefix % i + "_fx", fx)
-            np.save(dumpfile_prefix % i + "_pos", x)
+            dump_futures.append(io_pool.submit(np.save, dumpfile_prefix % i + "_fx", fx))
+            dump_futures.append(io_pool.submit(np.save, dumpfile_prefix % i + "_pos", x.copy()))
     else:
         dump = lambda *_: None
 
@@ -202,134 +346,273 @@ def pso(func, lb, ub, ieqcons=[], f_ieqcons=None, args=(), kwargs={},
     else:
         if debug:
             print('Single constraint function given in f_ieqcons')
-        cons = partial(_cons_f_ieqcons_wrapper, f_ieqcons, args, kwargs)
+        if not args and not kwargs:
+            cons = f_ieqcons
+        else:
+            cons = partial(_cons_f_ieqcons_wrapper, f_ieqcons, args, kwargs)
     is_feasible = partial(_is_feasible_wrapper, cons)
 
-    # Initialize the multiprocessing module if necessary
-    if processes > 1:
-        import multiprocessing
-        mp_pool = multiprocessing.Pool(processes)
-
-    # Initialize the particle swarm
-    S = swarmsize
-    D = len(lb)  # the number of dimensions each particle has
-    x = np.random.rand(S, D)  # particle positions
-    v = np.zeros_like(x)  # particle velocities
-    p = np.zeros_like(x)  # best particle positions
-    fx = np.zeros(S)  # current particle function values
-    fs = np.zeros(S, dtype=bool)  # feasibility of each particle
-    fp = np.ones(S)*np.inf  # best particle function values
-    g = []  # best swarm position
-    fg = np.inf  # best swarm position starting value
-
-    # Initialize the particle's position
-    x = lb + x*(ub - lb)
-
-    # Calculate objective and constraints for each particle
-    if processes > 1:
-        fx = np.array(mp_pool.map(obj, x))
-        fs = np.array(mp_pool.map(is_feasible, x))
-    elif processes != 0:
-        for i in range(S):
-            fx[i] = obj(x[i, :])
-            fs[i] = is_feasible(x[i, :])
-    else:
-        fx = obj(x)
-        fs = is_feasible(x)
-    dump(0, x, fx)
-
-    # Store particle's best position (if constraints are satisfied)
-    i_update = np.logical_and((fx < fp), fs)
-    p[i_update, :] = x[i_update, :].copy()
-    fp[i_update] = fx[i_update]
-
-    # Initialize global best position and score
-    i_min = np.argmin(fp)
-    p_min = p[i_min, :].copy()  # Initialize p_min with best initial position
-    fp_min = fp[i_min]  # Initialize fp_min with best initial score
-
-    if fp[i_min] < fg:
-        fg = fp[i_min]
-        g = p[i_min, :].copy()
-    else:
-        g = x[0, :].copy()
-
-    # Initialize the particle's velocity
-    v = vlow + np.random.rand(S, D)*(vhigh - vlow)
-
-    # Initialize iteration history
-    iteration_history = []
-
-    # Iterate until termination criterion met
-    it = 1
-    while it < maxiter:
-        rp = np.random.uniform(size=(S, D))
-        rg = np.random.uniform(size=(S, D))
-
-        # Update the particles velocities
-        v = omega*v + phip*rp*(p - x) + phig*rg*(g - x)
-        # Update the particles' positions
-        x = x + v
-        # Correct for bound violations
-        maskl = x < lb
-        masku = x > ub
-        x = x*(~np.logical_or(maskl, masku)) + lb*maskl + ub*masku
-
-        # Update objectives and constraints
-        if processes > 1:
-            fx = np.array(mp_pool.map(obj, x))
-            fs = np.array(mp_pool.map(is_feasible, x))
-        elif processes != 0:
-            for i in range(S):
-                fx[i] = obj(x[i, :])
+    # Whole-swarm versions of the constraint functions for vectorized mode
+    vectorized = vectorized or processes == 0
+    if vectorized:
+        if f_ieqcons is not None:
+            cons_vec = partial(_cons_f_ieqcons_wrapper_vec, f_ieqcons, args, kwargs)
+        elif len(ieqcons):
+            cons_vec = partial(_cons_ieqcons_wrapper_vec, ieqcons, args, kwargs,
+                               np.empty((len(ieqcons), swarmsize)))
+        else:
+            cons_vec = _cons_none_wrapper_vec
+        is_feasible_batch = partial(_is_feasible_wrapper_vec, cons_vec)
+
+    # Initialize the multiprocessing module if necessary, unless the caller
+    # supplied their own executor. Results carry the particle index, so the
+    # order in which they arrive doesn't matter
+    mp_pool = None
+    map_fn = None
+    if not vectorized:
+        if executor is not None:
+            map_fn = executor.map
+        elif processes > 1:
+            import multiprocessing
+            mp_pool = multiprocessing.Pool(processes)
+            map_fn = mp_pool.imap_unordered
+        indexed_eval = partial(_indexed_eval_wrapper, obj, is_feasible)
+
+    # Open the CSV output so iterations can be streamed to it. The writer
+    # thread is started after the pool so it isn't running during the fork
+    csvfile = None
+    if csv_output_path:
+        csvfile = _open_results_csv(csv_output_path)
+    if csvfile is not None:
+        csvwriter = csv.writer(csvfile, delimiter='\t')
+        csv_queue = queue.Queue()
+        csv_thread = threading.Thread(target=_csv_writer_loop, args=(csv_queue, csvfile), daemon=True)
+        csv_thread.start()
+
+    def evaluate(x):
+        """
+        Return the objective values and feasibility of every particle. The
+        objective is only evaluated for feasible particles; infeasible ones
+        get inf, as they can never become a particle's best position.
+        """
+        if vectorized:
+            fs = is_feasible_batch(x)
+            fx = np.full(len(x), np.inf)
+            i_feasible = np.flatnonzero(fs)
+            if i_feasible.size:
+                fx[i_feasible] = np.asarray(obj(x[i_feasible]), dtype=float).reshape(i_feasible.size)
+        elif map_fn is not None:
+            # Send each worker a block of particles rather than one at a time,
+            # and collect the results as they arrive
+            fx = np.empty(len(x))
+            fs = np.empty(len(x), dtype=bool)
+            chunksize = max(1, len(x) // (4*max(processes, 1)))
+            for i, fx_i, fs_i in map_fn(indexed_eval, enumerate(x), chunksize=chunksize):
+                fx[i] = fx_i
+                fs[i] = fs_i
+        else:
+            fx = np.empty(len(x))
+            fs = np.empty(len(x), dtype=bool)
+            for i in range(len(x)):
                 fs[i] = is_feasible(x[i, :])
+                fx[i] = obj(x[i, :]) if fs[i] else np.inf
+        return fx, fs
+
+    try:
+        # Initialize the particle swarm
+        S = swarmsize
+        D = len(lb)  # the number of dimensions each particle has
+        # The per-particle state is kept in one contiguous block, one row per
+        # particle laid out as [x, fx, p, fp, fs], so that the personal best
+        # update copies a single contiguous run of each row. APSO keeps no
+        # personal bests, so its rows are just [x, fx, fs]
+        state = np.empty((S, D + 2 if apso else 2*D + 3))
+        x = state[:, :D]  # particle positions
+        fx = state[:, D]  # current particle function values
+        fs = state[:, -1]  # feasibility of each particle (0 or 1)
+        x[:] = rng.random((S, D))
+        if apso:
+            p = fp = None
         else:
-            fx = obj(x)
-            fs = is_feasible(x)
-
-        # Store current iteration data
-        iteration_history.append((it, x.copy(), fx.copy()))
-        dump(it, x, fx)
+            p = state[:, D+1:2*D+1]  # best particle positions
+            fp = state[:, 2*D+1]  # best particle function values
+            current = state[:, :D+1]  # current position and value
+            best = state[:, D+1:2*D+2]  # best position and value
+            v = np.empty((S, D))  # particle velocities
+            p.fill(0.0)  # particles that never become feasible keep p = 0
+            fp.fill(np.inf)
+        g = np.empty(D)  # best swarm position, broadcast against x as (D,)
+        fg = np.inf  # best swarm position starting value
+
+        # Initialize the particle's position
+        x *= span
+        x += lb
+
+        # Calculate objective and constraints for each particle
+        fx[:], fs[:] = evaluate(x)
+        # Particles skipped as infeasible have fx = inf, but are recorded as NaN
+        dump(0, x, np.where(fs != 0, fx, np.nan))
 
         # Store particle's best position (if constraints are satisfied)
-        i_update = np.logical_and((fx < fp), fs)
-        p[i_update, :] = x[i_update, :].copy()
-        fp[i_update] = fx[i_update]
+        if apso:
+            # Candidates for the swarm's best are the feasible particles
+            pos_cand = x
+            f_cand = np.where(fs != 0, fx, np.inf)
+        else:
+            i_update = np.logical_and((fx < fp), fs)
+            best[i_update] = current[i_update]
+            pos_cand = p
+            f_cand = fp
+
+        # Initialize global best position and score
+        i_min = np.argmin(f_cand)
+        p_min = pos_cand[i_min, :].copy()  # Initialize p_min with best initial position
+        fp_min = f_cand[i_min]  # Initialize fp_min with best initial score
+
+        if f_cand[i_min] < fg:
+            fg = f_cand[i_min]
+            g[:] = pos_cand[i_min, :]
+        else:
+            g[:] = x[0, :]
 
-        # Compare swarm's best position with global best position
-        i_min = np.argmin(fp)
-        if fp[i_min] < fg:
-            if debug:
-                print('New best for swarm at iteration {:}: {:} {:}'.format(it, p[i_min, :], fp[i_min]))
-
-            p_min = p[i_min, :].copy()
-            fp_min = fp[i_min]
-            stepsize = np.sqrt(np.sum((g - p_min)**2))
-
-            if np.abs(fg - fp[i_min]) <= minfunc:
-                print('Stopping search: Swarm best objective change less than {:}'.format(minfunc))
-                break
-            elif stepsize <= minstep:
-                print('Stopping search: Swarm best position change less than {:}'.format(minstep))
-                break
+        if apso:
+            # From now on candidates are selected by feasibility in the loop
+            f_cand = fx
+        else:
+            # Initialize the particle's velocity
+            rng.random(out=v)
+            v *= vhigh - vlow
+            v += vlow
+
+        # Random factors and scratch buffer for the velocity update
+        rp = np.empty((S, D))
+        if not apso:
+            rg = np.empty((S, D))
+        if not apso and not jit:
+            tmp = np.empty((S, D))
+
+        # Iterate until termination criterion met
+        it = 1
+        while it < maxiter:
+            rng.random(out=rp)
+            if not apso:
+                rng.random(out=rg)
+
+            if apso:
+                # Move towards the swarm's best with a random step, in place:
+                # x = (1 - beta)*x + beta*g + alpha*(ub - lb)*(rp - 0.5)
+                rp -= 0.5
+                rp *= alpha*span
+                x *= 1 - beta
+                x += beta*g
+                x += rp
+                # Correct for bound violations
+                np.clip(x, lb, ub, out=x)
+            elif jit:
+                # Update velocities and positions, and correct for bound
+                # violations, in a single compiled kernel
+                pso_step(x, v, p, g, lb, ub, rp, rg, omega, phip, phig)
+            else:
+                # Update the particles velocities in place, using rp and rg as
+                # scratch space: v = omega*v + phip*rp*(p - x) + phig*rg*(g - x)
+                rp *= phip
+                rp *= np.subtract(p, x, out=tmp)
+                rg *= phig
+                rg *= np.subtract(g, x, out=tmp)
+                v *= omega
+                v += rp
+                v += rg
+                # Update the particles' positions
+                x += v
+                # Correct for bound violations
+                np.clip(x, lb, ub, out=x)
+
+            # Update objectives and constraints
+            fx[:], fs[:] = evaluate(x)
+
+            # Store current iteration data
+            # Particles skipped as infeasible have fx = inf, but are recorded as NaN
+            fx_record = np.where(fs != 0, fx, np.nan)
+            if csvfile is not None:
+                csv_queue.put((x.copy(), fx_record))
+            dump(it, x, fx_record)
+
+            # Store particle's best position (if constraints are satisfied)
+            if apso:
+                i_update = np.logical_and((fx < fg), fs)
             else:
-                g = p_min.copy()
-                fg = fp[i_min]
+                i_update = np.logical_and((fx < fp), fs)
+                best[i_update] = current[i_update]
+
+            # Compare swarm's best position with global best position. Only
+            # particles that just improved can have beaten the global best
+            i_improved = np.flatnonzero(i_update)
+            i_min = i_improved[np.argmin(f_cand[i_improved])] if i_improved.size else None
+            if i_min is not None and f_cand[i_min] < fg:
+                if debug:
+                    print('New best for swarm at iteration {:}: {:} {:}'.format(it, pos_cand[i_min, :], f_cand[i_min]))
+
+                p_min = pos_cand[i_min, :].copy()
+                fp_min = f_cand[i_min]
+                # The step length is compared squared, avoiding the sqrt; a
+                # negative minstep disables the check, as it did before
+                step = g - p_min
+
+                if np.abs(fg - f_cand[i_min]) <= minfunc:
+                    print('Stopping search: Swarm best objective change less than {:}'.format(minfunc))
+                    break
+                elif minstep >= 0 and step @ step <= minstep*minstep:
+                    print('Stopping search: Swarm best position change less than {:}'.format(minstep))
+                    break
+                else:
+                    g[:] = p_min
+                    fg = f_cand[i_min]
 
-        if debug:
-            print('Best after iteration {:}: {:} {:}'.format(it, g, fg))
-        it += 1
+            if debug:
+                print('Best after iteration {:}: {:} {:}'.format(it, g, fg))
+            it += 1
+    except BaseException:
+        # Don't wait for queued particles when stopping on an error
+        if mp_pool is not None:
+            mp_pool.terminate()
+            mp_pool.join()
+        if csvfile is not None:
+            csv_queue.put(None)
+            csv_thread.join()
+            csvfile.close()
+        if io_pool is not None:
+            io_pool.shutdown(wait=True)
+        raise
+    else:
+        if mp_pool is not None:
+            mp_pool.close()
+            mp_pool.join()
+        if io_pool is not None:
+            io_pool.shutdown(wait=True)
+            # Raise any error from writing the dump files
+            for future in dump_futures:
+                future.result()
 
     if it >= maxiter:
         print('Stopping search: maximum iterations reached --> {:}'.format(maxiter))
 
-    # Write final results to CSV if path is provided
-    if csv_output_path:
-        _write_results_to_csv(csv_output_path, iteration_history, p, fp, p_min, fp_min)
+    # Finish the CSV with the final results if path is provided
+    if csvfile is not None:
+        csv_queue.put(None)
+        csv_thread.join()
+        _write_best_to_csv(csvwriter, p_min, fp_min)
+        csvfile.close()
+        logger.info(f"CSV successfully written to {csv_output_path}")
 
-    if not is_feasible(g):
+    if vectorized:
+        g_feasible = is_feasible_batch(g[np.newaxis, :])[0]
+    else:
+        g_feasible = is_feasible(g)
+    if not g_feasible:
         print("However, the optimization couldn't find a feasible design. Sorry")
     if particle_output:
+        if apso:
+            return g, fg, x, fx
         return g, fg, p, fp
     else:
         return g, fg
\ No newline at end of file